@@ -0,0 +1,59 @@
+<?php
+
+namespace App\Http\Middleware;
+
+use Closure;
+use Illuminate\Http\JsonResponse;
+use Illuminate\Http\Request;
+use Symfony\Component\HttpFoundation\Response;
+
+class CaptureRequestLog
+{
+    public const SESSION_HEADER = 'X-Session-Id';
+
+    public function handle(Request $request, Closure $next): Response
+    {
+        return $next($request);
+    }
+
+    /**
+     * Append one compact JSON line describing the request to the capture log.
+     *
+     * Runs after the response has been flushed, so the write does not add to
+     * the latency seen by the client. Lines are therefore written in completion
+     * order; "ts" is the arrival time taken by the SAPI, and the replay in
+     * stress_test.py restores arrival order from it. For start-work, "mid" is
+     * the machine handed out, which lets the replay pair it with the
+     * choose-product that used it.
+     */
+    public function terminate(Request $request, Response $response): void
+    {
+        if (!config('app.request_log.enabled')) {
+            return;
+        }
+
+        $arrivedAt = (float) ($request->server('REQUEST_TIME_FLOAT')
+            ?? (defined('LARAVEL_START') ? LARAVEL_START : microtime(true)));
+
+        $entry = [
+            'ts' => round($arrivedAt, 6),
+            'sid' => $request->header(self::SESSION_HEADER) ?? $request->ip(),
+            'm' => $request->method(),
+            'p' => '/'.ltrim($request->path(), '/'),
+            'b' => $request->isJson() ? $request->json()->all() : null,
+            's' => $response->getStatusCode(),
+            'ms' => round((microtime(true) - $arrivedAt) * 1000, 2),
+        ];
+
+        if ($request->is('api/orchestrator/start-work') && $response instanceof JsonResponse
+            && $machineId = data_get($response->getData(true), 'machine.id')) {
+            $entry['mid'] = $machineId;
+        }
+
+        file_put_contents(
+            config('app.request_log.path'),
+            json_encode($entry, JSON_UNESCAPED_SLASHES).PHP_EOL,
+            FILE_APPEND | LOCK_EX,
+        );
+    }
+}
@@ -123,4 +123,21 @@
         'store' => env('APP_MAINTENANCE_STORE', 'database'),
     ],
 
+    /*
+    |--------------------------------------------------------------------------
+    | Request Capture Log
+    |--------------------------------------------------------------------------
+    |
+    | When enabled, every orchestrator request is appended as one JSON line
+    | to the given file. The log can be replayed against a test environment
+    | with "python stress_test.py --replay <path>" to benchmark real kiosk
+    | traffic.
+    |
+    */
+
+    'request_log' => [
+        'enabled' => (bool) env('REQUEST_LOG_ENABLED', false),
+        'path' => env('REQUEST_LOG_PATH', storage_path('logs/requests.jsonl')),
+    ],
+
 ];
@@ -3,6 +3,7 @@
 use App\Http\Controllers\OrchestratorController;
 use App\Http\Controllers\ProductController;
 use App\Http\Controllers\VendingMachineController;
+use App\Http\Middleware\CaptureRequestLog;
 use Illuminate\Support\Facades\Route;
 
 Route::apiResource('vending-machines', VendingMachineController::class);
@@ -14,5 +15,8 @@
 Route::delete('/products/{product}', [ProductController::class, 'delete']);
 
 
-Route::post('/orchestrator/start-work', [OrchestratorController::class, 'startWork']);
-Route::post('/orchestrator/choose-product', [OrchestratorController::class, 'chooseProduct']);
+// Only kiosk traffic is captured for replay; admin calls are left out of the log.
+Route::middleware(CaptureRequestLog::class)->group(function () {
+    Route::post('/orchestrator/start-work', [OrchestratorController::class, 'startWork']);
+    Route::post('/orchestrator/choose-product', [OrchestratorController::class, 'chooseProduct']);
+});
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
+import argparse
 import asyncio
+import heapq
 import json
 import statistics
 import sys
@@ -8,7 +10,7 @@ import time
 import random
 import aiohttp
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Iterator, Optional
 
 
 # ─── Configuration ───────────────────────────────────────────────────────────
@@ -25,6 +27,12 @@ REQUEST_TIMEOUT = 30
 
 CONNECTOR_LIMIT = 10000  # max simultaneous connections
 
+REPLAY_REORDER_WINDOW_S = 60  # how far a captured line may trail requests that arrived after it
+
+REPLAY_FLOW_TIMEOUT_S = 300  # how long a replayed start-work waits for its choose-product
+
+REPLAY_LATENCY_SAMPLE_SIZE = 10000  # latencies kept per endpoint for replay percentiles
+
 PRODUCT_NAMES = [
     "Cola", "Pepsi", "Water", "Juice", "Coffee",
     "Tea", "Chips", "Candy", "Cookie", "Gum",
@@ -137,11 +145,12 @@ async def http_request(
     method: str,
     url: str,
     json_body: Optional[dict] = None,
+    headers: Optional[dict] = None,
 ) -> RequestResult:
     result = RequestResult(endpoint=url)
     t0 = time.monotonic()
     try:
-        async with session.request(method, url, json=json_body) as resp:
+        async with session.request(method, url, json=json_body, headers=headers) as resp:
             result.status = resp.status
             try:
                 result.body = await resp.json()
@@ -342,6 +351,17 @@ async def setup_test_data(session: aiohttp.ClientSession) -> tuple[list[int], li
     return machine_ids, product_ids
 
 
+async def ensure_api_reachable(session: aiohttp.ClientSession):
+    """Exit with a hint if the API does not answer."""
+    r = await http_request(session, "GET", f"{BASE_URL}/products")
+    if r.error or r.status is None:
+        print(f"\n✗ Cannot reach API at {BASE_URL}")
+        print(f"  Error: {r.error}")
+        print("  Make sure 'docker compose up' is running.")
+        sys.exit(1)
+    print(f"\n✓ API reachable at {BASE_URL}")
+
+
 async def get_remaining_stock(session: aiohttp.ClientSession) -> int:
     """Sum up remaining stock across all products."""
     r = await http_request(session, "GET", f"{BASE_URL}/products")
@@ -560,6 +580,323 @@ def generate_markdown_report(reports: list[LevelReport], stock_snapshots: list[i
 
     return "\n".join(lines)
 
+# ─── Traffic replay ─────────────────────────────────────────────────────────
+
+SESSION_HEADER = "X-Session-Id"  # same header CaptureRequestLog reads the session key from
+
+START_WORK_PATH = "/api/orchestrator/start-work"
+CHOOSE_PRODUCT_PATH = "/api/orchestrator/choose-product"
+
+
+@dataclass
+class LatencySample:
+    """Bounded reservoir sample of latencies, so long replays use constant memory."""
+    capacity: int = REPLAY_LATENCY_SAMPLE_SIZE
+    count: int = 0
+    max_ms: float = 0.0
+    values: list = field(default_factory=list)
+
+    def add(self, latency_ms: float):
+        self.count += 1
+        self.max_ms = max(self.max_ms, latency_ms)
+        if len(self.values) < self.capacity:
+            self.values.append(latency_ms)
+        else:
+            i = random.randrange(self.count)
+            if i < self.capacity:
+                self.values[i] = latency_ms
+
+
+@dataclass
+class ReplayReport:
+    speed: float = 1.0
+    total_requests: int = 0
+    skipped_lines: int = 0
+    late_entries: int = 0
+    wall_time_s: float = 0.0
+    recorded_span_s: float = 0.0
+    max_lag_ms: float = 0.0
+    status_counts: dict = field(default_factory=dict)
+    endpoint_latencies: dict = field(default_factory=dict)
+    error_messages: dict = field(default_factory=dict)
+    divergences: dict = field(default_factory=dict)
+
+    @property
+    def effective_rps(self) -> float:
+        return self.total_requests / self.wall_time_s if self.wall_time_s > 0 else 0.0
+
+    def record_error(self, msg: str):
+        self.error_messages[msg] = self.error_messages.get(msg, 0) + 1
+
+    def record_divergence(self, reason: str):
+        self.divergences[reason] = self.divergences.get(reason, 0) + 1
+
+
+def iter_request_log(path: str, report: ReplayReport) -> Iterator[dict]:
+    """Lazily yield entries from a JSONL capture written by CaptureRequestLog."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                entry["ts"] = float(entry["ts"])
+            except (ValueError, KeyError, TypeError):
+                report.skipped_lines += 1
+                continue
+            if not entry.get("m") or not entry.get("p"):
+                report.skipped_lines += 1
+                continue
+            yield entry
+
+
+def iter_in_arrival_order(
+    entries: Iterator[dict],
+    window_s: float,
+    report: ReplayReport,
+) -> Iterator[dict]:
+    """
+    Restore arrival order for a log written in completion order.
+
+    Entries are held in a heap until the newest timestamp seen is more than
+    `window_s` ahead of them. An entry arriving after a later one has already
+    been released cannot be put back in place; it is counted as late.
+    """
+    heap = []
+    newest_ts = None
+    released_ts = None
+    for seq, entry in enumerate(entries):
+        ts = entry["ts"]
+        if released_ts is not None and ts < released_ts:
+            report.late_entries += 1
+        heapq.heappush(heap, (ts, seq, entry))
+        newest_ts = ts if newest_ts is None else max(newest_ts, ts)
+        while heap and heap[0][0] <= newest_ts - window_s:
+            ts, _, ready = heapq.heappop(heap)
+            released_ts = ts if released_ts is None else max(released_ts, ts)
+            yield ready
+    while heap:
+        _, _, ready = heapq.heappop(heap)
+        yield ready
+
+
+async def send_entry(
+    session: aiohttp.ClientSession,
+    entry: dict,
+    report: ReplayReport,
+    body: Optional[dict] = None,
+) -> RequestResult:
+    url = BASE_URL.rsplit("/api", 1)[0] + entry["p"]
+    # Forward the session key so a capture taken on the target stays replayable
+    headers = {SESSION_HEADER: str(entry["sid"])} if entry.get("sid") else None
+    r = await http_request(session, entry["m"], url, json_body=body or None, headers=headers)
+
+    endpoint = f"{entry['m']} {entry['p']}"
+    report.endpoint_latencies.setdefault(endpoint, LatencySample()).add(r.latency_ms)
+    status_key = r.error or str(r.status)
+    report.status_counts[status_key] = report.status_counts.get(status_key, 0) + 1
+    if r.error:
+        report.record_error(r.error)
+    return r
+
+
+async def replay_start_work(
+    session: aiohttp.ClientSession,
+    entry: dict,
+    report: ReplayReport,
+) -> Optional[int]:
+    """Re-issue a start-work and return the machine the target handed out, if any."""
+    r = await send_entry(session, entry, report, entry.get("b"))
+    machine_id = None
+    if r.status == 200 and r.body:
+        machine_id = r.body.get("machine", {}).get("id")
+
+    if machine_id and not entry.get("mid"):
+        report.record_divergence("start-work got a machine the capture did not")
+    elif not machine_id and entry.get("mid"):
+        report.record_divergence("start-work got no machine, the capture did")
+    return machine_id
+
+
+async def replay_choose_product(
+    session: aiohttp.ClientSession,
+    entry: dict,
+    report: ReplayReport,
+    start_work: Optional[asyncio.Task],
+):
+    """
+    Re-issue a choose-product on the machine its replayed start-work returned.
+
+    Machine ids from the capture don't exist on the replay target, so the
+    request is skipped and counted as a divergence when there is no replayed
+    machine to send it to.
+    """
+    if start_work is None:
+        report.record_divergence("choose-product without a captured start-work")
+        return
+
+    try:
+        machine_id = await start_work
+    except Exception:
+        machine_id = None
+    if not machine_id:
+        report.record_divergence("choose-product skipped, start-work got no machine")
+        return
+
+    await send_entry(session, entry, report, {**entry.get("b", {}), "machine_id": machine_id})
+
+
+async def run_replay(
+    session: aiohttp.ClientSession,
+    path: str,
+    speed: float,
+    window_s: float = REPLAY_REORDER_WINDOW_S,
+) -> ReplayReport:
+    """
+    Re-issue captured requests in arrival order, keeping the recorded gaps
+    between them (divided by `speed`).
+
+    Requests run concurrently; the only ordering kept is that each
+    choose-product waits for the start-work that handed out its machine,
+    matched on the session key and the recorded machine id.
+    """
+    report = ReplayReport(speed=speed)
+    # (sid, mid) -> (ts, start-work task), kept in release order so the
+    # oldest flows can be dropped from the front.
+    start_work_by_flow: dict[tuple, tuple[float, asyncio.Task]] = {}
+    pending: set[asyncio.Task] = set()
+
+    def finished(task: asyncio.Task):
+        pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            e = task.exception()
+            report.record_error(f"exception: {type(e).__name__}: {e}")
+
+    first_ts = None
+    last_ts = None
+    t0 = time.monotonic()
+    for entry in iter_in_arrival_order(iter_request_log(path, report), window_s, report):
+        ts = entry["ts"]
+        if first_ts is None:
+            first_ts = ts
+        last_ts = max(last_ts, ts) if last_ts is not None else ts
+
+        delay = t0 + max(ts - first_ts, 0.0) / speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            report.max_lag_ms = max(report.max_lag_ms, -delay * 1000)
+
+        # Abandoned flows would otherwise stay around until the replay ends
+        while start_work_by_flow:
+            key, (flow_ts, _) = next(iter(start_work_by_flow.items()))
+            if flow_ts >= ts - REPLAY_FLOW_TIMEOUT_S:
+                break
+            del start_work_by_flow[key]
+
+        sid = entry.get("sid")
+        body = entry.get("b")
+        if entry["p"] == START_WORK_PATH:
+            task = asyncio.create_task(replay_start_work(session, entry, report))
+            if entry.get("mid"):
+                key = (sid, entry["mid"])
+                start_work_by_flow.pop(key, None)
+                start_work_by_flow[key] = (ts, task)
+        elif entry["p"] == CHOOSE_PRODUCT_PATH and isinstance(body, dict):
+            _, start_work = start_work_by_flow.pop((sid, body.get("machine_id")), (None, None))
+            task = asyncio.create_task(replay_choose_product(session, entry, report, start_work))
+        else:
+            task = asyncio.create_task(send_entry(session, entry, report, body))
+
+        pending.add(task)
+        task.add_done_callback(finished)
+        report.total_requests += 1
+
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    report.wall_time_s = time.monotonic() - t0
+    if first_ts is not None:
+        report.recorded_span_s = last_ts - first_ts
+    return report
+
+
+def print_replay_report(report: ReplayReport):
+    """Pretty-print replay results to stdout."""
+    print(f"\n┌──────────────────────────────────────────────────────────┐")
+    print(f"│  Requests: {report.total_requests:>7}  │  Speed: {report.speed:>6.2f}x  │  RPS: {report.effective_rps:>8.1f} │")
+    print(f"│  Recorded span: {report.recorded_span_s:>9.2f}s  │  Wall time: {report.wall_time_s:>9.2f}s    │")
+    print(f"│  Max schedule lag: {report.max_lag_ms:>9.1f} ms                          │")
+    print(f"│  Skipped lines: {report.skipped_lines:>5}  │  Late (out of window): {report.late_entries:>5}        │")
+    print(f"├──────────────────────────────────────────────────────────┤")
+    print(f"│  Status codes:                                           │")
+    for status, count in sorted(report.status_counts.items(), key=lambda x: -x[1]):
+        print(f"│    {status[:30]:<30} {count:>7}                  │")
+    print(f"├──────────────────────────────────────────────────────────┤")
+    print(f"│  Latency per endpoint (ms):                              │")
+    for endpoint, sample in sorted(report.endpoint_latencies.items()):
+        print(f"│    {endpoint[:50]}")
+        print(f"│      n: {sample.count:>7}  p50: {percentile(sample.values, 50):>8.1f}  "
+              f"p95: {percentile(sample.values, 95):>8.1f}  p99: {percentile(sample.values, 99):>8.1f}")
+    print(f"└──────────────────────────────────────────────────────────┘")
+
+    if report.divergences:
+        print(f"  Divergences from the capture:")
+        for reason, count in sorted(report.divergences.items(), key=lambda x: -x[1]):
+            print(f"    [{count:>5}x] {reason}")
+
+    if report.error_messages:
+        print(f"  Error breakdown:")
+        for msg, count in sorted(report.error_messages.items(), key=lambda x: -x[1]):
+            print(f"    [{count:>5}x] {msg[:80]}")
+
+
+async def replay_main(path: str, speed: float):
+    print("=" * 60)
+    print("  VENDING MACHINE ORCHESTRATOR – TRAFFIC REPLAY")
+    print(f"  Replaying {path} at {speed:g}x")
+    print("=" * 60)
+
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=CONNECTOR_LIMIT, force_close=True)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        await ensure_api_reachable(session)
+
+        report = await run_replay(session, path, speed)
+        print_replay_report(report)
+
+        json_path = "doc/stress_test_replay_raw.json"
+        raw_data = {
+            "log": path,
+            "speed": speed,
+            "total_requests": report.total_requests,
+            "skipped_lines": report.skipped_lines,
+            "late_entries": report.late_entries,
+            "recorded_span_s": round(report.recorded_span_s, 3),
+            "wall_time_s": round(report.wall_time_s, 3),
+            "effective_rps": round(report.effective_rps, 1),
+            "max_lag_ms": round(report.max_lag_ms, 1),
+            "status_counts": report.status_counts,
+            "endpoints": {
+                endpoint: {
+                    "count": sample.count,
+                    "latency_p50_ms": round(percentile(sample.values, 50), 1),
+                    "latency_p95_ms": round(percentile(sample.values, 95), 1),
+                    "latency_p99_ms": round(percentile(sample.values, 99), 1),
+                    "latency_max_ms": round(sample.max_ms, 1),
+                }
+                for endpoint, sample in report.endpoint_latencies.items()
+            },
+            "divergences": report.divergences,
+            "error_messages": report.error_messages,
+        }
+        with open(json_path, "w") as f:
+            json.dump(raw_data, f, indent=2)
+        print(f"\n  📄 Raw data written to: {json_path}")
+
+
 async def main():
     print("=" * 60)
     print("  VENDING MACHINE ORCHESTRATOR – STRESS TEST")
@@ -570,14 +907,7 @@ async def main():
     connector = aiohttp.TCPConnector(limit=CONNECTOR_LIMIT, force_close=True)
 
     async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
-        # Check API is reachable
-        r = await http_request(session, "GET", f"{BASE_URL}/products")
-        if r.error or r.status is None:
-            print(f"\n✗ Cannot reach API at {BASE_URL}")
-            print(f"  Error: {r.error}")
-            print("  Make sure 'docker compose up' is running.")
-            sys.exit(1)
-        print(f"\n✓ API reachable at {BASE_URL}")
+        await ensure_api_reachable(session)
 
         # Setup
         machine_ids, product_ids = await setup_test_data(session)
@@ -660,4 +990,16 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Stress test the vending machine orchestrator API.")
+    parser.add_argument("--replay", metavar="LOG",
+                        help="replay a JSONL request log captured with REQUEST_LOG_ENABLED=true")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed-up factor, e.g. 10 replays an hour of traffic in 6 minutes")
+    args = parser.parse_args()
+
+    if args.replay:
+        if args.speed <= 0:
+            parser.error("--speed must be positive")
+        asyncio.run(replay_main(args.replay, args.speed))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,108 @@
+<?php
+
+namespace Tests\Feature;
+
+use App\Enums\VendingMachineStatus;
+use App\Models\Product;
+use App\Models\VendingMachine;
+use Illuminate\Foundation\Testing\RefreshDatabase;
+use Illuminate\Support\Facades\Queue;
+use Tests\TestCase;
+
+class RequestLogTest extends TestCase
+{
+    use RefreshDatabase;
+
+    private string $logPath;
+
+    protected function setUp(): void
+    {
+        parent::setUp();
+
+        $this->logPath = tempnam(sys_get_temp_dir(), 'request_log_');
+        config(['app.request_log.path' => $this->logPath]);
+    }
+
+    protected function tearDown(): void
+    {
+        @unlink($this->logPath);
+
+        parent::tearDown();
+    }
+
+    public function test_requests_are_not_captured_when_disabled(): void
+    {
+        config(['app.request_log.enabled' => false]);
+
+        $this->postJson('/api/orchestrator/start-work');
+
+        $this->assertSame('', file_get_contents($this->logPath));
+    }
+
+    public function test_requests_are_captured_as_json_lines(): void
+    {
+        config(['app.request_log.enabled' => true]);
+
+        $machine = VendingMachine::create(['name' => 'Machine A']);
+
+        $this->postJson('/api/orchestrator/start-work', [], ['X-Session-Id' => 'kiosk-1'])
+            ->assertStatus(200);
+        $this->postJson('/api/orchestrator/choose-product', [
+            'machine_id' => 999,
+            'product_id' => 1,
+            'count' => 1,
+            'coins' => 1,
+        ], ['X-Session-Id' => 'kiosk-1']);
+
+        $lines = file($this->logPath, FILE_IGNORE_NEW_LINES);
+        $this->assertCount(2, $lines);
+
+        $first = json_decode($lines[0], true);
+        $second = json_decode($lines[1], true);
+
+        $this->assertSame('kiosk-1', $first['sid']);
+        $this->assertSame('POST', $first['m']);
+        $this->assertSame('/api/orchestrator/start-work', $first['p']);
+        $this->assertSame(200, $first['s']);
+        $this->assertSame($machine->id, $first['mid']);
+        $this->assertSame('/api/orchestrator/choose-product', $second['p']);
+        $this->assertSame(1, $second['b']['product_id']);
+        $this->assertArrayNotHasKey('mid', $second);
+        $this->assertLessThanOrEqual($second['ts'], $first['ts']);
+    }
+
+    public function test_successful_purchase_is_captured_without_machine_id(): void
+    {
+        config(['app.request_log.enabled' => true]);
+        Queue::fake();
+
+        $machine = VendingMachine::create([
+            'name' => 'Machine A',
+            'status' => VendingMachineStatus::ChooseProduct,
+        ]);
+        $product = Product::create(['name' => 'Cola', 'stock' => 20]);
+
+        $this->postJson('/api/orchestrator/choose-product', [
+            'machine_id' => $machine->id,
+            'product_id' => $product->id,
+            'count' => 1,
+            'coins' => 1,
+        ])->assertStatus(200);
+
+        $entry = json_decode(file_get_contents($this->logPath), true);
+
+        $this->assertSame(200, $entry['s']);
+        $this->assertSame($machine->id, $entry['b']['machine_id']);
+        $this->assertArrayNotHasKey('mid', $entry);
+    }
+
+    public function test_admin_requests_are_not_captured(): void
+    {
+        config(['app.request_log.enabled' => true]);
+
+        $this->postJson('/api/products', ['name' => 'Cola', 'stock' => 10])
+            ->assertStatus(201);
+
+        $this->assertSame('', file_get_contents($this->logPath));
+    }
+}
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stress_test as st
+
+
+START_WORK = "/api/orchestrator/start-work"
+CHOOSE_PRODUCT = "/api/orchestrator/choose-product"
+
+
+def write_log(tmp_path, lines):
+    path = tmp_path / "requests.jsonl"
+    path.write_text("\n".join(l if isinstance(l, str) else json.dumps(l) for l in lines) + "\n")
+    return str(path)
+
+
+def start_work(ts, sid, mid=None):
+    entry = {"ts": ts, "sid": sid, "m": "POST", "p": START_WORK, "b": []}
+    if mid:
+        entry["mid"] = mid
+    return entry
+
+
+def choose_product(ts, sid, machine_id):
+    body = {"machine_id": machine_id, "product_id": 1, "count": 1, "coins": 1}
+    return {"ts": ts, "sid": sid, "m": "POST", "p": CHOOSE_PRODUCT, "b": body}
+
+
+def replay(monkeypatch, tmp_path, lines, start_work_responses, speed=1.0,
+           window_s=st.REPLAY_REORDER_WINDOW_S):
+    """
+    Replay `lines` against a local mock; start-work answers come from
+    `start_work_responses`. Returns the report, the requests the mock saw and
+    the highest number of start-work calls it served at once.
+    """
+    seen = []
+    in_flight = {"now": 0, "max": 0}
+
+    async def handle_start_work(request):
+        seen.append(("start-work", time.monotonic(), request.headers.get(st.SESSION_HEADER)))
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.05)
+        in_flight["now"] -= 1
+        status, machine_id = start_work_responses.pop(0)
+        if status != 200:
+            return web.json_response({"error": "No idle vending machine available."}, status=status)
+        return web.json_response({"machine": {"id": machine_id}})
+
+    async def handle_choose_product(request):
+        body = await request.json()
+        seen.append(("choose-product", body["machine_id"]))
+        return web.json_response({})
+
+    async def run():
+        app = web.Application()
+        app.router.add_post(START_WORK, handle_start_work)
+        app.router.add_post(CHOOSE_PRODUCT, handle_choose_product)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        monkeypatch.setattr(st, "BASE_URL", f"http://127.0.0.1:{port}/api")
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await st.run_replay(session, write_log(tmp_path, lines), speed, window_s)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run()), seen, in_flight["max"]
+
+
+def test_arrival_order_is_restored_within_window():
+    report = st.ReplayReport()
+    entries = [{"ts": ts} for ts in (1.0, 3.0, 2.0, 10.0, 0.5)]
+
+    ordered = [e["ts"] for e in st.iter_in_arrival_order(iter(entries), 5.0, report)]
+
+    assert ordered == [1.0, 2.0, 3.0, 0.5, 10.0]
+    assert report.late_entries == 1
+
+    report = st.ReplayReport()
+    entries = [{"ts": ts} for ts in (1.0, 10.0, 20.0, 3.0, 4.0)]
+
+    ordered = [e["ts"] for e in st.iter_in_arrival_order(iter(entries), 5.0, report)]
+
+    assert ordered == [1.0, 10.0, 3.0, 4.0, 20.0]
+    assert report.late_entries == 2
+
+
+def test_latency_sample_is_bounded():
+    sample = st.LatencySample(capacity=10)
+    for i in range(1000):
+        sample.add(float(i))
+
+    assert sample.count == 1000
+    assert len(sample.values) == 10
+    assert sample.max_ms == 999.0
+
+
+def test_choose_product_uses_replayed_machine(monkeypatch, tmp_path):
+    lines = [
+        start_work(1000.0, "kiosk", mid=7),
+        choose_product(1000.01, "kiosk", 7),
+        "not json",
+        {"ts": 1000.02, "sid": "kiosk"},
+    ]
+
+    report, seen, _ = replay(monkeypatch, tmp_path, lines, [(200, 101)])
+
+    assert [s[0] for s in seen] == ["start-work", "choose-product"]
+    assert seen[1] == ("choose-product", 101)
+    assert report.skipped_lines == 2
+    assert report.total_requests == 2
+
+
+def test_failed_start_work_does_not_reuse_previous_machine(monkeypatch, tmp_path):
+    lines = [
+        start_work(1000.0, "kiosk", mid=7),
+        choose_product(1000.1, "kiosk", 7),
+        start_work(1000.2, "kiosk", mid=8),
+        choose_product(1000.3, "kiosk", 8),
+    ]
+
+    report, seen, _ = replay(monkeypatch, tmp_path, lines, [(200, 101), (409, None)])
+
+    assert [s for s in seen if s[0] == "choose-product"] == [("choose-product", 101)]
+    assert report.divergences == {
+        "start-work got no machine, the capture did": 1,
+        "choose-product skipped, start-work got no machine": 1,
+    }
+
+
+def test_completion_order_log_is_replayed_in_arrival_order_and_scaled(monkeypatch, tmp_path):
+    # The second start-work arrived first but finished last, so it was logged last
+    lines = [
+        start_work(1002.0, "b"),
+        start_work(1000.0, "a"),
+    ]
+
+    report, seen, _ = replay(monkeypatch, tmp_path, lines, [(409, None), (409, None)], speed=4.0)
+
+    assert [s[2] for s in seen] == ["a", "b"]
+    # 2 s recorded at 4x is 0.5 s; the bounds only need to rule out 1x
+    gap = seen[1][1] - seen[0][1]
+    assert 0.3 < gap < 1.5
+    assert report.late_entries == 0
+    assert abs(report.recorded_span_s - 2.0) < 1e-6
+
+
+def test_sessions_sharing_a_key_run_concurrently(monkeypatch, tmp_path):
+    lines = [
+        start_work(1000.0, "10.0.0.1", mid=1),
+        start_work(1000.0, "10.0.0.1", mid=2),
+        choose_product(1000.0, "10.0.0.1", 2),
+        choose_product(1000.0, "10.0.0.1", 1),
+    ]
+
+    report, seen, max_start_work_in_flight = replay(monkeypatch, tmp_path, lines, [(200, 101), (200, 102)])
+
+    assert max_start_work_in_flight == 2
+    assert sorted(s[1] for s in seen if s[0] == "choose-product") == [101, 102]
+    assert report.divergences == {}
+
+
+def test_abandoned_flows_are_dropped_after_timeout(monkeypatch, tmp_path):
+    late = 1000.0 + st.REPLAY_FLOW_TIMEOUT_S + 1
+    lines = [
+        start_work(1000.0, "kiosk", mid=7),
+        start_work(late, "kiosk", mid=8),
+        choose_product(late + 0.1, "kiosk", 7),
+    ]
+
+    report, seen, _ = replay(monkeypatch, tmp_path, lines, [(200, 101), (200, 102)], speed=1000.0)
+
+    assert [s for s in seen if s[0] == "choose-product"] == []
+    assert report.divergences == {"choose-product without a captured start-work": 1}